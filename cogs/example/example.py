@@ -1,18 +1,56 @@
 # Module d'exemple commenté où on va faire en sorte que le bot réponde à des messages qu'on lui envoie
 
+import asyncio
 import logging
-from datetime import datetime
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Literal
 
 import discord
 from discord import Interaction, app_commands
 from discord.ext import commands
 
 from common import dataio
-from common.utils import fuzzy
+
+# pyahocorasick est optionnel (v. README) : s'il est installé, on l'utilise pour chercher tous les triggers en une seule passe sur le message
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # On définit un logger, ça va servir à renvoyer proprement les erreurs pour facilement les retrouver
 logger = logging.getLogger(f'NEROSYS.{__name__.split(".")[-1]}')
 
+# Toutes les données du module sont dans une seule base partagée par les serveurs (une colonne guild_id sert à les distinguer)
+# C'est plus léger qu'un fichier par serveur quand le bot est sur beaucoup de serveurs : une seule connexion, un seul fichier WAL
+DB_NAME = 'triggers'
+
+# Valeurs par défaut des paramètres, utilisées tant qu'un serveur ne les a pas modifiées
+DEFAULT_SETTINGS = {
+    'enabled': 1, # Un paramètre enabled qui décide si la fonctionnalité est activée ou non
+    'cooldown': 5 # Un paramètre cooldown qui définit le cooldown entre chaque réponse en secondes
+}
+
+# Les requêtes SQL fréquentes sont définies une seule fois : sqlite3 garde en cache les requêtes déjà préparées tant que le texte est identique
+_SQL_SELECT_SETTINGS = "SELECT key, value FROM settings WHERE guild_id = ? AND key IN ('enabled', 'cooldown')"
+_SQL_SELECT_ALL_SETTINGS = "SELECT guild_id, key, value FROM settings WHERE key IN ('enabled', 'cooldown')"
+_SQL_SET_SETTING = 'INSERT OR REPLACE INTO settings (guild_id, key, value) VALUES (?, ?, ?)'
+_SQL_SELECT_ALL = 'SELECT id, trigger, response, author_id FROM messages WHERE guild_id = ? ORDER BY id'
+_SQL_SELECT_TRIGGERS = 'SELECT trigger, response FROM messages WHERE guild_id = ? ORDER BY id'
+_SQL_SEARCH = "SELECT id, trigger FROM messages WHERE guild_id = ? AND trigger LIKE ? ESCAPE '\\' ORDER BY trigger LIKE ? ESCAPE '\\' DESC, id LIMIT 25"
+_SQL_COUNT = 'SELECT COUNT(1) AS n FROM messages WHERE guild_id = ?'
+_SQL_INSERT = 'INSERT OR IGNORE INTO messages (guild_id, trigger, response, author_id) VALUES (?, ?, ?, ?) RETURNING id'
+_SQL_DELETE = 'DELETE FROM messages WHERE guild_id = ? AND id = ?'
+
+_NO_MENTIONS = discord.AllowedMentions.none() # Les réponses ne doivent jamais mentionner qui que ce soit (@everyone, rôles, membres)
+
+MAX_TRIGGERS = 20 # On veut pas plus de 20 triggers par serveur pour éviter les abus
+COOLDOWNS_MAX_SIZE = 100_000 # Nombre maximal de cooldowns gardés en mémoire, les plus anciens sont supprimés au-delà
+
+class _DatabaseClosed(RuntimeError):
+    """Levée quand on accède à la base de données alors que le module est en cours de déchargement"""
+
 # On crée la classe du module, qui doit hériter de commands.Cog et qui porte généralement le même nom que le fichier
 class Example(commands.Cog):
     """Module d'exemple : gestionnaire de triggers personnalisés""" # Cette description est affichée dans la commande d'aide
@@ -20,66 +58,242 @@ class Example(commands.Cog):
         self.bot = bot # On récupère l'instance du bot
         self.data = dataio.get_instance(self) # On récupère l'instance de dataio qui va gérer les données de ce module et les organiser tout seul dans un sous-dossier 'data' dans le dossier du module
         
-        # Vu qu'on veut des paramètres, on en définit par défaut
-        # Les paramètres sont stockés sous la forme d'un dictionnaire str: str donc faut que tous les paramètres puissent être convertis en str facilement
-        default_settings = {
-            'enabled': 1, # Un paramètre enabled qui décide si la fonctionnalité est activée ou non
-            'cooldown': 5 # Un paramètre cooldown qui définit le cooldown entre chaque réponse en secondes
-        }
-        # Vu que les paramètres sont sous la forme simplifiée clef/valeur, on peut utiliser une déclaration de table dataio DictTable
-        settings = dataio.DictTableDefault('settings', default_settings) # Voir common/dataio.py pour plus d'infos
+        # Les paramètres sont stockés sous la forme clef/valeur, avec en plus l'ID du serveur auquel ils appartiennent
+        # Les paramètres sont des str donc faut que tous les paramètres puissent être convertis en str facilement
+        settings = dataio.TableDefault("""CREATE TABLE IF NOT EXISTS settings (
+            guild_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT,
+            PRIMARY KEY (guild_id, key)
+            )""") # Voir common/dataio.py pour plus d'infos
         
         # On va faire une autre table pour stocker les messages de réponse
         # Cette fois on va utiliser une table dataio Table, ce qui nécessite de créer manuellement la table et donc de connaître un peu de SQL
         messages = dataio.TableDefault("""CREATE TABLE IF NOT EXISTS messages (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
             trigger TEXT,
             response TEXT,
             author_id INTEGER
-            )""")
-        # Vu qu'on veut que ces données soient stockées par serveur, on va les déclarer comme tables de fichiers serveurs
-        self.data.set_defaults(discord.Guild, settings, messages)
+            )""", indexes=[
+                'CREATE UNIQUE INDEX IF NOT EXISTS idx_msg_guild_trigger ON messages (guild_id, trigger)', # Index unique : c'est SQLite qui refuse les triggers en double sur un même serveur
+                'CREATE INDEX IF NOT EXISTS idx_msg_guild_id ON messages (guild_id, id)' # Index pour lister les triggers d'un serveur dans l'ordre
+            ])
+        # Les tables sont déclarées sur un modèle nommé (str) plutôt que sur discord.Guild : on obtient un seul fichier pour tous les serveurs
+        self.data.set_defaults(DB_NAME, settings, messages)
+        
+        # On va stocker les cooldowns sur la RAM sous la forme {(guild_id, user_id): timestamp}
+        # C'est un OrderedDict utilisé comme cache LRU : les utilisateurs les moins récents sont supprimés pour ne pas grossir indéfiniment
+        self.__cooldowns : OrderedDict[tuple[int, int], float] = OrderedDict()
+        
+        # Les requêtes SQLite sont bloquantes, on les exécute donc dans un thread à part pour ne pas bloquer le bot pendant les accès disque
+        # Un seul thread : les connexions SQLite ne supportent pas d'être utilisées par plusieurs threads en même temps
+        self.__db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='example-db')
+        self.__db_closed = False
         
-        self.__cooldowns : dict[int, dict[int, float]] = {} # On va stocker les cooldowns dans un dictionnaire sur la RAM sous la forme {guild_id: {user_id: cooldown}}
+        # Pour éviter d'interroger la base de données à chaque message, on garde en cache les triggers et les paramètres de chaque serveur
+        self.__triggers_cache : dict[int, list[tuple[str, str]]] = {} # {guild_id: [(trigger, response), ...]}
+        self.__automatons : dict[int, 'ahocorasick.Automaton | None'] = {} # {guild_id: automate compilé à partir des triggers, chaque mot renvoie sa position dans la liste}
+        self.__min_lengths : dict[int, int] = {} # {guild_id: longueur du plus court trigger}, un message plus court ne peut rien déclencher
+        self.__send_tasks : set[asyncio.Task] = set() # On garde une référence aux envois en cours pour qu'ils ne soient pas supprimés avant la fin
+        self.__has_triggers : set[int] = set() # Serveurs qui ont au moins un trigger, pour ignorer directement les messages des autres
+        self.__checked_guilds : set[int] = set() # Serveurs dont on a déjà vérifié le nombre de triggers
+        self.__settings : dict[int, dict] = {} # {guild_id: {'enabled': bool, 'cooldown': int}}, chargé au démarrage et tenu à jour par les setters
         
-    def cog_unload(self): # Il est conseillé de toujours définir cette fonction pour fermer self.data et éviter les fuites mémoire
+    async def cog_load(self): # Appelée par discord.py au chargement du module, on peut y faire des choses asynchrones
+        await self._run_db(self._migrate_guild_files)
+        # Les paramètres changent rarement mais sont lus à chaque message : on les charge tous une fois pour toutes
+        self.__settings.update(await self._run_db(self._load_all_settings))
+        
+    async def cog_unload(self): # Il est conseillé de toujours définir cette fonction pour fermer self.data et éviter les fuites mémoire
+        self.__db_closed = True # Plus aucune nouvelle requête n'est acceptée à partir d'ici
+        # On attend la fin des requêtes en cours avant de fermer les connexions, depuis un autre thread pour ne pas bloquer le bot
+        await asyncio.to_thread(self.__db_executor.shutdown, wait=True)
         self.data.close_all()
+        
+    @property
+    def db(self) -> dataio.ModelDataManager:
+        """Base de données partagée par tous les serveurs"""
+        return self.data.get(DB_NAME)
+        
+    async def _run_db(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Exécute une fonction d'accès à la base de données dans le thread dédié et renvoie son résultat"""
+        if self.__db_closed:
+            raise _DatabaseClosed('Le module est en cours de déchargement')
+        return await asyncio.get_running_loop().run_in_executor(self.__db_executor, func, *args)
+    
+    def _migrate_guild_files(self) -> None:
+        """Importe dans la base partagée les anciennes bases séparées par serveur (guild_<id>.db) puis les renomme en .db.migrated"""
+        db = self.db
+        for path in sorted((self.data.cog_folder / 'data').glob('guild_*.db')):
+            # Un fichier invalide ne doit pas empêcher le module de charger : on le signale, on le laisse tel quel et on passe au suivant
+            try:
+                guild_id = int(path.stem.split('_')[1])
+                db.execute('ATTACH DATABASE ? AS old', (str(path),))
+            except Exception:
+                logger.exception(f"Impossible d'ouvrir l'ancienne base {path.name}, elle n'a pas été migrée")
+                continue
+            try:
+                db.execute('INSERT OR IGNORE INTO settings (guild_id, key, value) SELECT ?, key, value FROM old.settings', (guild_id,), commit=False)
+                db.execute('INSERT OR IGNORE INTO messages (guild_id, trigger, response, author_id) SELECT ?, trigger, response, author_id FROM old.messages ORDER BY id', (guild_id,), commit=False)
+                db.commit()
+            except Exception:
+                db.conn.rollback() # On annule la transaction en cours, sinon la base attachée reste verrouillée et ne peut pas être détachée
+                logger.exception(f"Impossible de migrer l'ancienne base {path.name}, elle a été laissée telle quelle")
+                continue
+            finally:
+                db.execute('DETACH DATABASE old')
+            path.rename(path.with_suffix('.db.migrated'))
+            logger.info(f"Données du serveur {guild_id} migrées vers la base partagée")
     
     # FONCTIONS DE GESTION DES PARAMÈTRES ========================
     
-    def is_enabled(self, guild: discord.Guild) -> bool:
+    def _parse_settings(self, values: dict[str, str]) -> dict:
+        """Convertit les valeurs brutes de la table en {'enabled': bool, 'cooldown': int}, les valeurs absentes sont remplacées par celles par défaut"""
+        values = {**DEFAULT_SETTINGS, **values}
+        return {'enabled': bool(int(values['enabled'])), 'cooldown': int(values['cooldown'])}
+    
+    def _load_settings(self, guild: discord.Guild) -> dict:
+        """Lit les paramètres du serveur (à exécuter dans le thread de la base de données)"""
+        # On récupère les deux paramètres en une seule requête
+        return self._parse_settings({row['key']: row['value'] for row in self.db.fetch_all(_SQL_SELECT_SETTINGS, (guild.id,))})
+    
+    def _load_all_settings(self) -> dict[int, dict]:
+        """Lit les paramètres de tous les serveurs en une seule requête (à exécuter dans le thread de la base de données)"""
+        values : dict[int, dict[str, str]] = {}
+        for row in self.db.fetch_all(_SQL_SELECT_ALL_SETTINGS):
+            values.setdefault(row['guild_id'], {})[row['key']] = row['value']
+        return {guild_id: self._parse_settings(v) for guild_id, v in values.items()}
+    
+    async def _get_settings(self, guild: discord.Guild) -> dict:
+        """Renvoie les paramètres du serveur sous la forme {'enabled': bool, 'cooldown': int} depuis la mémoire"""
+        if guild.id not in self.__settings: # Serveur rejoint après le démarrage ou sans paramètres enregistrés
+            loaded = await self._run_db(self._load_settings, guild)
+            # Si un autre chargement a fini avant nous, on garde le sien : il a peut-être déjà été modifié par un setter
+            return self.__settings.setdefault(guild.id, loaded)
+        return self.__settings[guild.id]
+    
+    async def is_enabled(self, guild: discord.Guild) -> bool:
         """Vérifie si la fonctionnalité est activée sur le serveur"""
-        # Vu que la table de paramètres une table DictTable, on peut utiliser les raccourcis get_dict_value et set_dict_value pour accéder aux paramètres (v. common/dataio.py)
-        return self.data.get(guild).get_dict_value('settings', 'enabled', cast=bool) # On cast en bool pour obtenir un booléen
+        return (await self._get_settings(guild))['enabled']
     
-    def set_enabled(self, guild: discord.Guild, enabled: bool) -> None:
+    async def set_enabled(self, guild: discord.Guild, enabled: bool) -> None:
         """Active ou désactive la fonctionnalité sur le serveur"""
-        self.data.get(guild).set_dict_value('settings', 'enabled', enabled) # On utilise set_dict_value pour modifier les paramètres
+        await self._run_db(lambda: self.db.execute(_SQL_SET_SETTING, (guild.id, 'enabled', str(int(enabled))))) # Les booléens sont stockés sous la forme 0/1
+        # On met aussi à jour la copie en mémoire, récupérée après l'écriture pour ne pas modifier une copie remplacée entre-temps
+        (await self._get_settings(guild))['enabled'] = enabled
         
-    def get_guild_cooldown(self, guild: discord.Guild) -> int:
+    async def get_guild_cooldown(self, guild: discord.Guild) -> int:
         """Renvoie le cooldown en secondes"""
-        return self.data.get(guild).get_dict_value('settings', 'cooldown', cast=int)
+        return (await self._get_settings(guild))['cooldown']
     
-    def set_guild_cooldown(self, guild: discord.Guild, cooldown: int) -> None:
+    async def set_guild_cooldown(self, guild: discord.Guild, cooldown: int) -> None:
         """Définit le cooldown en secondes"""
-        self.data.get(guild).set_dict_value('settings', 'cooldown', cooldown)
+        await self._run_db(lambda: self.db.execute(_SQL_SET_SETTING, (guild.id, 'cooldown', str(cooldown))))
+        (await self._get_settings(guild))['cooldown'] = cooldown
         
     # FONCTIONS DE GESTION DES MESSAGES ==========================
     
-    def get_messages(self, guild: discord.Guild) -> list[dict[str, str]]:
+    async def get_messages(self, guild: discord.Guild) -> list[dict[str, str]]:
         """Renvoie la liste des messages de réponse"""
         # Là il faut savoir utiliser SQL pour récupérer les données vu que ce n'est pas un simple dictionnaire
-        r = self.data.get(guild).fetch_all('SELECT * FROM messages') # On utilise fetch_all pour exécuter une requête SQL et récupérer tous les résultats
+        r = await self._run_db(lambda: self.db.fetch_all(_SQL_SELECT_ALL, (guild.id,))) # On utilise fetch_all pour exécuter une requête SQL et récupérer tous les résultats
         return r if r else []
     
-    def add_message(self, guild: discord.Guild, trigger: str, response: str, author_id: int) -> None:
-        """Ajoute un message de réponse"""
-        # On utilise execute pour exécuter une requête SQL sans récupérer de résultat
-        self.data.get(guild).execute('INSERT INTO messages (trigger, response, author_id) VALUES (?, ?, ?)', (trigger, response, author_id))
+    async def get_triggers_only(self, guild: discord.Guild) -> list[tuple[str, str]]:
+        """Renvoie seulement les triggers et leurs réponses sous la forme [(trigger, response), ...]"""
+        # Le listener n'a besoin que de ces deux colonnes, on les récupère directement en tuples
+        return await self._run_db(lambda: self.db.fetch_all(_SQL_SELECT_TRIGGERS, (guild.id,), raw=True))
+    
+    async def search_messages(self, guild: discord.Guild, query: str) -> list[dict[str, str]]:
+        """Renvoie les 25 premiers messages de réponse dont le trigger contient `query` (ceux qui commencent par `query` en premier)"""
+        # On échappe les caractères spéciaux de LIKE pour qu'ils soient cherchés tels quels
+        query = query.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return await self._run_db(lambda: self.db.fetch_all(_SQL_SEARCH, (guild.id, f'%{query}%', f'{query}%')))
+    
+    async def count_messages(self, guild: discord.Guild) -> int:
+        """Renvoie le nombre de messages de réponse"""
+        # Pas besoin de récupérer toutes les lignes pour les compter, SQLite s'en charge
+        return await self._run_db(lambda: self.db.fetch(_SQL_COUNT, (guild.id,))['n'])
+    
+    async def add_message(self, guild: discord.Guild, trigger: str, response: str, author_id: int) -> Literal['added', 'duplicate', 'limit']:
+        """Ajoute un message de réponse
         
-    def remove_message(self, guild: discord.Guild, id: int) -> None:
+        :return: 'added' si le message a été ajouté, 'duplicate' si le déclencheur est déjà utilisé, 'limit' si le serveur a atteint MAX_TRIGGERS"""
+        # Le comptage et l'insertion sont faits dans la même fonction : le thread de la base étant unique, rien ne peut s'intercaler entre les deux
+        def insert() -> Literal['added', 'duplicate', 'limit']:
+            if self.db.fetch(_SQL_COUNT, (guild.id,))['n'] >= MAX_TRIGGERS:
+                return 'limit'
+            # Grâce à l'index unique, INSERT OR IGNORE ne renvoie aucune ligne si le trigger existe déjà
+            row = self.db.fetch(_SQL_INSERT, (guild.id, trigger, response, author_id))
+            self.db.commit() # fetch n'enregistre pas les modifications tout seul
+            return 'duplicate' if row is None else 'added'
+        result = await self._run_db(insert)
+        if result != 'added':
+            return result
+        self._invalidate_triggers(guild.id)
+        self.__has_triggers.add(guild.id)
+        return result
+        
+    async def remove_message(self, guild: discord.Guild, id: int) -> None:
         """Supprime un message de réponse"""
-        self.data.get(guild).execute('DELETE FROM messages WHERE id = ?', (id,))
+        await self._run_db(lambda: self.db.execute(_SQL_DELETE, (guild.id, id))) # On filtre aussi sur le serveur pour ne pas pouvoir supprimer le trigger d'un autre
+        self._invalidate_triggers(guild.id)
+        if not await self.count_messages(guild):
+            self.__has_triggers.discard(guild.id)
+        
+    def _invalidate_triggers(self, guild_id: int) -> None:
+        """Vide tout ce qui est calculé à partir des triggers du serveur, à appeler dès que ses triggers changent"""
+        self.__triggers_cache.pop(guild_id, None)
+        self.__automatons.pop(guild_id, None)
+        self.__min_lengths.pop(guild_id, None)
+        
+    async def _has_triggers(self, guild: discord.Guild) -> bool:
+        """Vérifie si le serveur a au moins un trigger (le nombre n'est lu qu'une fois par serveur)"""
+        if guild.id not in self.__checked_guilds:
+            if await self.count_messages(guild):
+                self.__has_triggers.add(guild.id)
+            self.__checked_guilds.add(guild.id)
+        return guild.id in self.__has_triggers
+        
+    async def _cached_triggers(self, guild: discord.Guild) -> list[tuple[str, str]]:
+        """Renvoie la liste des triggers du serveur sous la forme [(trigger, response), ...] depuis le cache"""
+        if guild.id not in self.__triggers_cache:
+            # Les triggers sont déjà enregistrés en minuscules mais on s'en assure une fois ici plutôt qu'à chaque message
+            triggers = [(trigger.lower(), response) for trigger, response in await self.get_triggers_only(guild)]
+            self.__triggers_cache[guild.id] = triggers
+            self.__min_lengths[guild.id] = min((len(trigger) for trigger, _ in triggers), default=0)
+        return self.__triggers_cache[guild.id]
+    
+    async def _cached_automaton(self, guild: discord.Guild) -> 'ahocorasick.Automaton | None':
+        """Renvoie l'automate Aho-Corasick des triggers du serveur (ou None si pyahocorasick n'est pas installé ou qu'il n'y a aucun trigger)"""
+        if ahocorasick is None:
+            return None
+        if guild.id not in self.__automatons:
+            triggers = await self._cached_triggers(guild)
+            if not triggers:
+                self.__automatons[guild.id] = None
+            else:
+                automaton = ahocorasick.Automaton()
+                for index, (trigger, _) in enumerate(triggers):
+                    automaton.add_word(trigger, index)
+                automaton.make_automaton()
+                self.__automatons[guild.id] = automaton
+        return self.__automatons[guild.id]
+    
+    def _find_response(self, content: str, triggers: list[tuple[str, str]], automaton: 'ahocorasick.Automaton | None') -> str | None:
+        """Renvoie la réponse du premier trigger trouvé dans le message, ou None si aucun ne correspond
+        
+        Si plusieurs triggers sont dans le message, c'est le plus ancien (le premier de la liste, par ID) qui l'emporte, avec ou sans pyahocorasick"""
+        content = content.lower() # On met le message en minuscules une seule fois pour tous les triggers
+        if automaton is not None:
+            # Une seule passe sur le message pour tous les triggers, puis on garde celui qui a la plus petite position dans la liste
+            index = min((i for _, i in automaton.iter(content)), default=None)
+            return triggers[index][1] if index is not None else None
+        for trigger, response in triggers:
+            if trigger in content:
+                return response
+        return None
         
     # COMMANDES ===================================================
     
@@ -96,7 +310,7 @@ class Example(commands.Cog):
         if not isinstance(interaction.guild, discord.Guild):
             return await interaction.response.send_message(content="**Erreur ·** Cette commande n'est pas disponible en MP", ephemeral=True)
         
-        self.set_enabled(interaction.guild, enabled)
+        await self.set_enabled(interaction.guild, enabled)
         await interaction.response.send_message(content=f"**Succès ·** La fonctionnalité a été {'activée' if enabled else 'désactivée'} sur le serveur", ephemeral=True)
         
     @config_group.command(name='cooldown')
@@ -107,7 +321,7 @@ class Example(commands.Cog):
         if not isinstance(interaction.guild, discord.Guild):
             return await interaction.response.send_message(content="**Erreur ·** Cette commande n'est pas disponible en MP", ephemeral=True)
         
-        self.set_guild_cooldown(interaction.guild, cooldown)
+        await self.set_guild_cooldown(interaction.guild, cooldown)
         await interaction.response.send_message(content=f"**Succès ·** Le cooldown a été défini à {cooldown} secondes", ephemeral=True)
         
     # On crée un groupe de commandes pour gérer les messages de réponse (serveur uniquement, par défaut accessible à tout le monde)
@@ -120,14 +334,12 @@ class Example(commands.Cog):
         if not isinstance(interaction.guild, discord.Guild):
             return await interaction.response.send_message(content="**Erreur ·** Cette commande n'est pas disponible en MP", ephemeral=True)
         
-        messages = self.get_messages(interaction.guild)
+        messages = await self.get_messages(interaction.guild)
         if not messages:
             return await interaction.response.send_message(content="**Erreur ·** Aucun message de réponse n'a été défini sur ce serveur", ephemeral=True)
         
-        text = ''
-        for message in messages:
-            text += f"`{message['id']}` : *{message['trigger']}* -> *{message['response']}*\n"
-            
+        # On construit la liste des lignes puis on les assemble en une fois plutôt que de concaténer à chaque tour
+        text = '\n'.join(f"`{message['id']}` : *{message['trigger']}* -> *{message['response']}*" for message in messages)
         embed = discord.Embed(title="Messages de réponse", description=text)
         await interaction.response.send_message(embed=embed, ephemeral=True)
         
@@ -142,16 +354,12 @@ class Example(commands.Cog):
             return await interaction.response.send_message(content="**Erreur ·** Cette commande n'est pas disponible en MP", ephemeral=True)
         
         trigger = trigger.lower() # On met le trigger en minuscules pour éviter les problèmes de casse
-        # On vériie que le trigger n'est pas déjà utilisé
-        messages = self.get_messages(interaction.guild)
-        for msg in messages:
-            if msg['trigger'] == trigger:
-                return await interaction.response.send_message(content="**Erreur ·** Ce déclencheur est déjà utilisé", ephemeral=True)
-        # On veut pas plus de 20 triggers par serveur pour éviter les abus
-        if len(messages) >= 20:
+        # add_message vérifie à la fois la limite de triggers du serveur et que le trigger n'est pas déjà utilisé
+        result = await self.add_message(interaction.guild, trigger, response, interaction.user.id)
+        if result == 'limit':
             return await interaction.response.send_message(content="**Erreur ·** Tu as atteint le nombre maximum de messages de réponse", ephemeral=True)
-        
-        self.add_message(interaction.guild, trigger, response, interaction.user.id)
+        if result == 'duplicate':
+            return await interaction.response.send_message(content="**Erreur ·** Ce déclencheur est déjà utilisé", ephemeral=True)
         await interaction.response.send_message(content=f"**Succès ·** Le message de réponse a été ajouté", ephemeral=True)
         
     @trig_group.command(name='remove')
@@ -162,17 +370,16 @@ class Example(commands.Cog):
         if not isinstance(interaction.guild, discord.Guild):
             return await interaction.response.send_message(content="**Erreur ·** Cette commande n'est pas disponible en MP", ephemeral=True)
         
-        self.remove_message(interaction.guild, id)
+        await self.remove_message(interaction.guild, id)
         await interaction.response.send_message(content=f"**Succès ·** Le message de réponse a été supprimé", ephemeral=True)
         
     # Vu que ça va pas être facile de retrouver l'ID de tête, on va créer une fonction d'autocomplétion pour la commande trig remove
     @trig_remove.autocomplete('id')
     async def trig_remove_autocomplete(self, interaction: Interaction, current: str):
-        # On se sert de fuzzy.finder qui est intégré dans le dossier common.utils pour retrouver le trigger le plus proche lié à l'ID
+        # On laisse SQLite filtrer les triggers qui contiennent ce qui est tapé ('current') plutôt que de tout récupérer et trier en Python
         if not isinstance(interaction.guild, discord.Guild):
             return [] # Si on est en MP, on renvoie une liste vide pour ne pas afficher de résultats
-        messages = self.get_messages(interaction.guild)
-        results = fuzzy.finder(current, messages, key=lambda x: x['trigger']) # La fonction les trie par similitude avec ce qui est tapé ('current')
+        results = await self.search_messages(interaction.guild, current)
         return [app_commands.Choice(name=f"{result['id']} : {result['trigger']}", value=result['id']) for result in results] # On renvoie une liste de choix pour l'autocomplétion (v. discord.py)
 
     # On crée un listener de message pour répondre aux messages de réponse
@@ -181,23 +388,60 @@ class Example(commands.Cog):
         if not isinstance(message.guild, discord.Guild) or message.author.bot: # On s'assure que le message est bien sur un serveur et qu'il n'est pas envoyé par un bot
             return
         
-        if not self.is_enabled(message.guild): # On vérifie que la fonctionnalité est activée sur le serveur
+        try:
+            if not await self._has_triggers(message.guild): # Pas de trigger sur le serveur, pas besoin d'aller plus loin
+                return
+            
+            # Les paramètres sont gardés en mémoire pour ne pas lire la base de données à chaque message
+            settings = await self._get_settings(message.guild)
+            if not settings['enabled']: # On vérifie que la fonctionnalité est activée sur le serveur
+                return
+            guild_cooldown = settings['cooldown']
+            
+            # On charge les triggers avant de vérifier le cooldown pour qu'il n'y ait plus aucune attente entre la vérification et la mise à jour du cooldown
+            triggers = await self._cached_triggers(message.guild)
+            if len(message.content) < self.__min_lengths.get(message.guild.id, 0): # Message trop court pour contenir un trigger
+                return
+            automaton = await self._cached_automaton(message.guild)
+        except _DatabaseClosed: # Le module a été déchargé pendant qu'on traitait le message, on l'ignore
             return
         
         # On vérifie que le cooldown est bien passé
-        guild_cooldown = self.get_guild_cooldown(message.guild)
-        cds = self.__cooldowns.setdefault(message.guild.id, {})
-        last_resp = cds.setdefault(message.author.id, 0)
-        if last_resp + guild_cooldown > datetime.now().timestamp():
+        # On ne fait que lire ici : la plupart des messages ne déclenchent rien, inutile de modifier le dictionnaire pour eux
+        cd_key = (message.guild.id, message.author.id)
+        # Pas de valeur par défaut à 0 : time.monotonic() part du démarrage de la machine, un utilisateur jamais vu pourrait être bloqué
+        last_resp = self.__cooldowns.get(cd_key)
+        if last_resp is not None and last_resp + guild_cooldown > time.monotonic():
             return
         
-        # On recherche un événement qui correspond au message (pas optimisé du tout mais c'est un exemple)
-        messages = self.get_messages(message.guild)
-        for msg in messages:
-            if msg['trigger'] in message.content:
-                await message.channel.send(msg['response'], silent=True) # On envoie la réponse en silent pour éviter que des malins s'en servent pour spam
-                cds[message.author.id] = datetime.now().timestamp() # On met à jour le cooldown avec le timestamp actuel
-                break # On sort de la boucle pour ne pas répondre plusieurs fois
+        # On recherche un événement qui correspond au message
+        response = self._find_response(message.content, triggers, automaton)
+        if response is not None: # On ne répond qu'une seule fois, au premier trigger trouvé
+            # On met à jour le cooldown AVANT d'envoyer la réponse, sinon plusieurs messages envoyés pendant l'envoi passeraient tous
+            self.__cooldowns[cd_key] = time.monotonic() # On met à jour le cooldown avec l'horloge monotone du système
+            self.__cooldowns.move_to_end(cd_key) # On marque l'utilisateur comme récent
+            if len(self.__cooldowns) > COOLDOWNS_MAX_SIZE:
+                self.__cooldowns.popitem(last=False) # On supprime l'utilisateur le moins récent
+            
+            # On n'attend pas la fin de l'envoi pour rendre la main
+            task = asyncio.create_task(self._send_response(message.channel, response))
+            self.__send_tasks.add(task)
+            task.add_done_callback(self.__send_tasks.discard)
+            
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        # Le bot a quitté le serveur : on libère ce qu'on gardait en mémoire pour lui (les données restent dans la base)
+        self.__settings.pop(guild.id, None)
+        self._invalidate_triggers(guild.id)
+        self.__has_triggers.discard(guild.id)
+        self.__checked_guilds.discard(guild.id)
+            
+    async def _send_response(self, channel: discord.abc.Messageable, response: str) -> None:
+        """Envoie la réponse d'un trigger en journalisant les erreurs de Discord"""
+        try:
+            await channel.send(response, silent=True, allowed_mentions=_NO_MENTIONS) # On envoie la réponse en silent et sans mentions pour éviter que des malins s'en servent pour spam
+        except discord.HTTPException:
+            logger.exception("Impossible d'envoyer la réponse d'un trigger")
         
 async def setup(bot):
     await bot.add_cog(Example(bot))
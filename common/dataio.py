@@ -7,13 +7,20 @@ import re
 import sqlite3
 from contextlib import closing
 from pathlib import Path
-from typing import Any, Iterable, Sequence
+from typing import Any, Iterable, Literal, Sequence, overload
 
 import discord
 from discord.ext import commands
 
 RESOURCES_PATH = Path('common/resources')
 __INSTANCES : dict[str, 'CogData'] = {}
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA busy_timeout=5000'
+)
 
 # DONNEES DE COG ===============================================
 
@@ -177,9 +184,16 @@ class ModelDataManager:
     # --- Connexions ---
     
     def __get_connection(self, path: Path) -> sqlite3.Connection:
-        conn = sqlite3.connect(path)
+        # Les requêtes préparées sont réutilisées tant que le texte SQL est identique
+        # La connexion peut être utilisée depuis un autre thread (ex. run_in_executor) tant que les accès sont faits un par un
+        conn = sqlite3.connect(path, cached_statements=256, check_same_thread=False)
         conn.row_factory = sqlite3.Row
         
+        # Réglages de performance : le WAL permet de lire pendant une écriture, synchronous=NORMAL limite les fsync (sûr en mode WAL)
+        # et le mmap permet de lire les pages depuis le cache de l'OS sans appel système. Les écritures restent à faire une par une.
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        
         # Initialisation des tables (défaults)
         commit_on_close = False
         with closing(conn.cursor()) as cursor:
@@ -188,6 +202,8 @@ class ModelDataManager:
                 if not default.insert_on_reconnect and default.table_name in tables: # Si la table existe déjà et qu'on ne veut pas réinsérer les valeurs par défaut
                     continue
                 cursor.execute(default.query)
+                for index_query in default.indexes:
+                    cursor.execute(index_query)
                 if default.default_values:
                     cursor.executemany(f'INSERT OR IGNORE INTO {default.table_name} ({", ".join(default.default_values[0].keys())}) VALUES ({", ".join(["?" for _ in default.default_values[0]])})', 
                                        [tuple(d.values()) for d in default.default_values])
@@ -233,14 +249,21 @@ class ModelDataManager:
             cursor.execute(query, *args)
             return cursor.fetchone()
         
-    def fetch_all(self, query: str, *args: Any) -> list[dict[str, Any]]:
+    @overload
+    def fetch_all(self, query: str, *args: Any, raw: Literal[False] = ...) -> list[dict[str, Any]]: ...
+    @overload
+    def fetch_all(self, query: str, *args: Any, raw: Literal[True]) -> list[tuple[Any, ...]]: ...
+    def fetch_all(self, query: str, *args: Any, raw: bool = False) -> list[dict[str, Any]] | list[tuple[Any, ...]]:
         """Exécute une requête SQL sur la base de données et renvoie tous les résultats.
 
         :param query: Requête SQL
         :param args: Arguments de la requête
+        :param raw: Si `True`, renvoie les lignes sous forme de tuples plutôt que de `sqlite3.Row`
         :return: Résultat de la requête
         """
         with closing(self.conn.cursor()) as cursor:
+            if raw:
+                cursor.row_factory = None
             cursor.execute(query, *args)
             return cursor.fetchall()
         
@@ -336,17 +359,22 @@ class ModelDataManager:
 # DEFAULTS ==================================================
 
 class TableDefault:
-    def __init__(self, query: str, default_values: Sequence[dict[str, Any]] = [], *, insert_on_reconnect: bool = False):
+    def __init__(self, query: str, default_values: Sequence[dict[str, Any]] = [], *, insert_on_reconnect: bool = False, indexes: Sequence[str] = []):
         """Classe de définition d'une table de données d'un modèle
 
         :param query: Requête de création de la table (`CREATE TABLE ...`)
         :param default_values: Valeurs par défaut à insérer dans la table
         :param insert_on_reconnect: Si `True`, les valeurs sont réinsérées à chaque connexion si absentes
+        :param indexes: Requêtes de création des index de la table (`CREATE [UNIQUE] INDEX IF NOT EXISTS ...`)
         """
         if not query.startswith('CREATE TABLE'):
             raise ValueError('La requête doit commencer par "CREATE TABLE"')
         self.query = query
         
+        if not all(re.match(r'CREATE (UNIQUE )?INDEX', q) for q in indexes):
+            raise ValueError('Les requêtes d\'index doivent commencer par "CREATE INDEX" ou "CREATE UNIQUE INDEX"')
+        self.indexes = indexes
+        
         if default_values:
             keys = set(default_values[0].keys())
             if not all(set(d.keys()) == keys for d in default_values):